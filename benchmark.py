@@ -0,0 +1,173 @@
+#!/bin/python
+
+import json
+import platform
+import random
+import sys
+import time
+from argparse import ArgumentParser
+from statistics import median
+from typing import Callable, Dict, List, Tuple, Any
+
+from game import Game, Difficulty, FieldState, solve
+
+Bench = Tuple[Callable[[int, int], Any], Callable[[Any], Any]]
+
+SIZES = ["9x9", "16x16", "30x16", "100x100", "500x500", "2000x2000"]
+SWEEP = 10000
+
+
+def _size(width: int, height: int) -> Tuple[int, int]:
+    # Border neighbour tables are cached per size; build it here so only the constructor itself is timed
+    Game(width, height)
+    return width, height
+
+
+def _fresh(width: int, height: int) -> Game:
+    return Game(width, height)
+
+
+def _started(width: int, height: int) -> Game:
+    game = Game(width, height)
+    game.init_mines((width // 2, height // 2))
+    return game
+
+
+def _clicked(width: int, height: int) -> Game:
+    game = _started(width, height)
+    game.click_field((width // 2, height // 2))
+    return game
+
+
+def _chord_ready(width: int, height: int) -> Tuple[Game, Tuple[int, int]]:
+    # An opened number with every adjacent mine flagged, so clicking it chords the remaining neighbours
+    game = _clicked(width, height)
+    all_mines = set(game.mine_cells())
+    for i in sorted(game.frontier):
+        unknown = [j for j in game.neighbors(i) if game.is_unknown(j)]
+        mines = [j for j in unknown if j in all_mines]
+        if len(mines) < len(unknown):
+            for j in mines:
+                game.flag_field(game.int_to_point(j), True)
+            return game, game.int_to_point(i)
+    return game, (width // 2, height // 2)
+
+
+def _sweep(game: Game) -> List[Tuple[int, int]]:
+    size = game.width * game.height
+    step = max(1, size // SWEEP)
+    return [game.int_to_point(i) for i in range(0, size, step)]
+
+
+def _count_all(state: Tuple[Game, List[Tuple[int, int]]]) -> None:
+    game, fields = state
+    for p in fields:
+        game.count_mines(p)
+
+
+def _state_all(state: Tuple[Game, List[Tuple[int, int]]]) -> None:
+    game, fields = state
+    for p in fields:
+        game.field_state(p)
+
+
+def _all_fields(width: int, height: int) -> Tuple[Game, List[Tuple[int, int]]]:
+    game = _clicked(width, height)
+    return game, _sweep(game)
+
+
+def _opened_fields(width: int, height: int) -> Tuple[Game, List[Tuple[int, int]]]:
+    game = _clicked(width, height)
+    return game, [p for p in _sweep(game) if game.field_state(p) == FieldState.OPEN]
+
+
+# Each benchmark is (setup, measured); setup runs untimed before every measurement
+BENCHMARKS: Dict[str, Bench] = {
+    "init": (_size, lambda s: Game(*s)),
+    "init_mines": (_fresh, lambda g: g.init_mines((g.width // 2, g.height // 2))),
+    "click_cascade": (_started, lambda g: g.click_field((g.width // 2, g.height // 2))),
+    "click_chord": (_chord_ready, lambda s: s[0].click_field(s[1])),
+    "open": (_started, lambda g: g._open((g.width // 2, g.height // 2))),
+    "count_mines": (_opened_fields, _count_all),
+    "field_state": (_all_fields, _state_all),
+    "copy": (_clicked, lambda g: g.copy()),
+    "hint": (_clicked, lambda g: g.hint()),
+    "solve": (_clicked, solve),
+}
+
+
+def measure(bench: Bench, width: int, height: int, seed: int, budget: float, max_runs: int) -> Dict[str, float]:
+    setup, measured = bench
+    times = []
+    # The budget covers setup too, so boards that are slow to build still get a single run
+    deadline = time.perf_counter() + budget
+    while len(times) == 0 or (len(times) < max_runs and time.perf_counter() < deadline):
+        random.seed(seed)
+        state = setup(width, height)
+        start = time.perf_counter()
+        measured(state)
+        times.append((time.perf_counter() - start) * 1000)
+    return {"best_ms": round(min(times), 4), "median_ms": round(median(times), 4), "runs": len(times)}
+
+
+def run(sizes: List[str], names: List[str], seed: int, budget: float, max_runs: int) -> Dict[str, Any]:
+    Game.difficulty = Difficulty.NORMAL
+    Game.no_guess = False
+
+    results = {}
+    for size in sizes:
+        width, height = [int(v) for v in size.split("x")]
+        for name in names:
+            key = "{}@{}".format(name, size)
+            results[key] = measure(BENCHMARKS[name], width, height, seed, budget, max_runs)
+            print("{:<28} {:>12.4f} ms  ({} runs)".format(key, results[key]["median_ms"], results[key]["runs"]),
+                  file=sys.stderr)
+
+    return {"python": platform.python_version(), "seed": seed, "results": results}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    regressed = False
+    print("{:<28} {:>12} {:>12} {:>8}".format("benchmark", "baseline", "current", "ratio"))
+    for key, value in current["results"].items():
+        if key not in baseline["results"]:
+            continue
+        before = baseline["results"][key]["median_ms"]
+        after = value["median_ms"]
+        ratio = after / before if before > 0 else 1.0
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = " slower"
+            regressed = True
+        elif ratio < 1 - threshold:
+            mark = " faster"
+        print("{:<28} {:>12.4f} {:>12.4f} {:>7.2f}x{}".format(key, before, after, ratio, mark))
+    return regressed
+
+
+def main(argv: List[str]) -> int:
+    parser = ArgumentParser(description="Time the engine hot paths on seeded boards.")
+    parser.add_argument("-s", "--sizes", nargs="+", default=SIZES, help="WIDTHxHEIGHT")
+    parser.add_argument("-b", "--bench", nargs="+", default=list(BENCHMARKS.keys()), choices=BENCHMARKS.keys())
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds per benchmark and size")
+    parser.add_argument("--max-runs", type=int, default=50)
+    parser.add_argument("-o", "--output", default="benchmark.json", help="where to save the results")
+    parser.add_argument("--baseline", help="earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change reported as a regression")
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.bench, args.seed, args.budget, args.max_runs)
+    with open(args.output, "w") as file:
+        json.dump(current, file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+        if compare(current, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
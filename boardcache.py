@@ -0,0 +1,148 @@
+#!/bin/python
+
+from os import path, replace
+from struct import Struct
+from threading import Lock
+from typing import List, Tuple, Optional
+
+import instrument
+
+Key = Tuple[int, int, int, int, bool]
+Entry = Tuple[Key, bytes, bytes]
+
+_MAGIC = b"PMB1"
+_HEADER = Struct("<HHIB?")
+
+
+def to_bitmap(size: int, cells: List[int]) -> bytes:
+    bits = bytearray((size + 7) // 8)
+    for i in cells:
+        bits[i >> 3] |= 1 << (i & 7)
+    return bytes(bits)
+
+
+def from_bitmap(bits: bytes) -> List[int]:
+    cells = []
+    for k, byte in enumerate(bits):
+        while byte:
+            low = byte & -byte
+            cells.append(k * 8 + low.bit_length() - 1)
+            byte ^= low
+    return cells
+
+
+def _has_bit(bits: bytes, i: int) -> bool:
+    return bits[i >> 3] >> (i & 7) & 1 == 1
+
+
+class BoardCache:
+    _filename = path.expanduser("~/.pmines.boards")
+    _entries: List[Entry] = []
+    _lock = Lock()
+    _write_lock = Lock()
+
+    limit = 64
+    target = 8
+
+    @staticmethod
+    @instrument.measured("board_cache.load")
+    def load():
+        entries = []
+        if path.isfile(BoardCache._filename):
+            with open(BoardCache._filename, "rb") as file:
+                data = file.read()
+            if data[:len(_MAGIC)] == _MAGIC:
+                pos = len(_MAGIC)
+                while pos + _HEADER.size <= len(data):
+                    width, height, count, difficulty, no_guess = _HEADER.unpack_from(data, pos)
+                    pos += _HEADER.size
+                    length = (width * height + 7) // 8
+                    if pos + 2 * length > len(data):
+                        break
+                    key = (width, height, count, difficulty, no_guess)
+                    entries.append((key, data[pos:pos + length], data[pos + length:pos + 2 * length]))
+                    pos += 2 * length
+        with BoardCache._lock:
+            BoardCache._entries = entries[-BoardCache.limit:]
+
+    @staticmethod
+    @instrument.measured("board_cache.store")
+    def store():
+        # Writers take turns from snapshot to rename, so the file always ends up with the newest entries
+        with BoardCache._write_lock:
+            with BoardCache._lock:
+                save = [_MAGIC]
+                for key, mines, start in BoardCache._entries:
+                    save.append(_HEADER.pack(*key))
+                    save.append(mines)
+                    save.append(start)
+
+            # Written aside and swapped in, so a filler killed mid-write never leaves a torn file
+            temp = BoardCache._filename + ".tmp"
+            with open(temp, "wb") as file:
+                file.write(b"".join(save))
+            replace(temp, BoardCache._filename)
+
+    @staticmethod
+    def _try_store():
+        # The cache only saves time; failing to persist it must never break a game
+        try:
+            BoardCache.store()
+        except OSError:
+            pass
+
+    @staticmethod
+    def size(key: Key) -> int:
+        with BoardCache._lock:
+            return sum(1 for entry in BoardCache._entries if entry[0] == key)
+
+    @staticmethod
+    def add(key: Key, mines: List[int], start: List[int]) -> None:
+        size = key[0] * key[1]
+        with BoardCache._lock:
+            BoardCache._entries.append((key, to_bitmap(size, mines), to_bitmap(size, start)))
+            # Oldest entries go first, whatever their key
+            del BoardCache._entries[:-BoardCache.limit]
+        BoardCache._try_store()
+
+    @staticmethod
+    def take(key: Key, p: Tuple[int, int]) -> Optional[List[int]]:
+        # A layout is only usable if the first click lands in its start region; mirrored layouts are
+        # just as solvable, so each entry is tried under the four reflections of the board
+        width, height = key[0], key[1]
+        x, y = p
+        found = None
+        with BoardCache._lock:
+            for index, (k, mines, start) in enumerate(BoardCache._entries):
+                if k != key:
+                    continue
+                for flip_x in (False, True):
+                    for flip_y in (False, True):
+                        sx = width - 1 - x if flip_x else x
+                        sy = height - 1 - y if flip_y else y
+                        if found is None and _has_bit(start, sx + width * sy):
+                            found = index, flip_x, flip_y
+                if found is not None:
+                    break
+            if found is None:
+                return None
+            index, flip_x, flip_y = found
+            mines = BoardCache._entries.pop(index)[1]
+        BoardCache._try_store()
+
+        result = []
+        for i in from_bitmap(mines):
+            mx, my = i % width, i // width
+            if flip_x:
+                mx = width - 1 - mx
+            if flip_y:
+                my = height - 1 - my
+            result.append(mx + width * my)
+        return result
+
+
+if __name__ == "__main__":
+    BoardCache.load()
+
+    for entry in BoardCache._entries:
+        print(entry[0], len(from_bitmap(entry[1])), len(from_bitmap(entry[2])))
@@ -1,13 +1,28 @@
-import itertools
+import os
 import time
+from array import array
+from multiprocessing import Array, Process, Event as ProcessEvent, Queue as ProcessQueue
+from queue import Empty
 from enum import Enum
-from random import sample
-from typing import Optional, Callable
-from typing import Set, Tuple, List
-import sys
+from fractions import Fraction
+from math import comb
+from random import randint, getrandbits, seed
+from threading import Event
+from typing import Optional, Callable, Iterator
+from typing import Set, Tuple, List, Dict
+
+import instrument
+from boardcache import BoardCache, Key
 
 Field = Tuple[int, int]
 
+_MINE = 0x01
+_FLAG = 0x02
+_OPEN = 0x04
+_HELPED = 0x08
+
+_UNKNOWN_TABLE = bytes([0 if c & (_OPEN | _FLAG) else 1 for c in range(256)])
+
 
 def current_time():
     return int(round(time.time() * 1000))
@@ -39,6 +54,77 @@ class Difficulty(Enum):
     NORMAL = 1
     HARD = 2
 
+
+class Reason(Enum):
+    START = 0
+    ALL_MINES = 1
+    ALL_FLAGGED = 2
+    SUBSET = 3
+    LINEAR = 4
+    ENDGAME = 5
+
+
+# A solver step: the field, FieldState.OPEN or FieldState.FLAG, why, and the fields opened by it
+Step = Tuple[Field, FieldState, Reason, Optional[Set[Field]]]
+
+# Only border cells need their neighbors listed; an interior cell i always has i-w-1 ... i+w+1
+BorderTable = Dict[int, Tuple[int, ...]]
+
+_border_tables: Dict[Tuple[int, int], BorderTable] = {}
+
+
+def border_table(width: int, height: int) -> BorderTable:
+    key = (width, height)
+    table = _border_tables.get(key)
+    if table is None:
+        table = _build_border_table(width, height)
+        _border_tables[key] = table
+    return table
+
+
+# Same order as Direction: top, top right, right, ..., top left
+_DELTAS = [(0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1)]
+
+
+def _build_border_table(width: int, height: int) -> BorderTable:
+    table: BorderTable = {}
+    for y in range(0, height):
+        columns = range(0, width) if y == 0 or y == height - 1 else (0, width - 1)
+        for x in columns:
+            neighbors = []
+            for dx, dy in _DELTAS:
+                nx = x + dx
+                ny = y + dy
+                if 0 <= nx < width and 0 <= ny < height:
+                    neighbors.append(nx + width * ny)
+            table[x + width * y] = tuple(neighbors)
+    return table
+
+
+def sample_mines(size: int, count: int, lock: Set[int]) -> List[int]:
+    free = size - len(lock)
+    if count > free:
+        raise ValueError("Bomb count is bigger then allowed!")
+
+    # Floyd's algorithm: a uniform count-subset of the free ranks in O(count)
+    ranks: Set[int] = set()
+    for j in range(free - count, free):
+        t = randint(0, j)
+        if t in ranks:
+            t = j
+        ranks.add(t)
+
+    locked = sorted(lock)
+    mines: List[int] = []
+    for r in ranks:
+        for x in locked:
+            if x > r:
+                break
+            r += 1
+        mines.append(r)
+    return mines
+
+
 def calc_mine_count(width: int, height: int) -> int:
     factor = 6.25
     if Game.difficulty == Difficulty.EASY:
@@ -51,8 +137,12 @@ def calc_mine_count(width: int, height: int) -> int:
 class Game:
 
     difficulty = Difficulty.NORMAL
+    no_guess = False
+    board_size: Optional[Tuple[int, int]] = None
+    generation_budget = 3000
+    generation_workers = os.cpu_count() or 1
 
-    def __init__(self, width: int, height: int, count: int = 0):
+    def __init__(self, width: int, height: int, count: int = 0, no_guess: bool = None):
         if width * height - 8 < count:
             raise ValueError("Bomb count is bigger then allowed!")
 
@@ -64,10 +154,23 @@ class Game:
 
         self._count: int = count
 
-        self._mines: Set[Field] = None
-        self._flags: Set[Field] = set()
-        self._opened: Set[Field] = set()
-        self._helped: Set[Field] = set()
+        if no_guess is None:
+            no_guess = Game.no_guess
+        self._no_guess: bool = no_guess
+        self.generation_attempts: int = 0
+        self.guess_fallback: bool = False
+
+        self._border = border_table(width, height)
+        self._cells: bytearray = bytearray(width * height)
+        self._counts: bytearray = None
+        self._regions: array = None
+        self._region_cells: List[array] = []
+        self._bbbv: int = 0
+        self._unknown: bytearray = None
+        self._frontier: Set[int] = set()
+        self._started: bool = False
+        self._opened_count: int = 0
+        self._flag_count: int = 0
         self._running: bool = True
         self._won: bool = None
         self._last_time = current_time()
@@ -126,6 +229,13 @@ class Game:
             return None
         return x, y
 
+    def neighbors(self, i: int) -> Tuple[int, ...]:
+        border = self._border.get(i)
+        if border is not None:
+            return border
+        w = self._width
+        return i - w, i - w + 1, i + 1, i + w + 1, i + w, i + w - 1, i - 1, i - w - 1
+
     def point_to_int(self, p: Field) -> int:
         x, y = p
         return x + self._width * y
@@ -133,34 +243,107 @@ class Game:
     def int_to_point(self, i: int) -> Field:
         return i % self._width, i // self._width
 
+    @instrument.measured("game.init_mines")
     def init_mines(self, p: Field) -> None:
-        lock: Set[int] = set()
+        if self._no_guess:
+            mines = BoardCache.take(cache_key(self._width, self._height, self._count, True), p)
+            if instrument.ENABLED:
+                instrument.increment("board_cache.hit" if mines is not None else "board_cache.miss")
+            if mines is not None:
+                self.place_mines(mines)
+                return
+            mines, self.generation_attempts = generate_no_guess(self._width, self._height, self._count, p,
+                                                                Game.generation_budget, Game.generation_workers)
+            if mines is not None:
+                self.place_mines(mines)
+                return
+            # Out of budget: a uniform board it is, flagged so the player can be told
+            self._no_guess = False
+            self.guess_fallback = True
+
+        lock: Set[int] = set(self.neighbors(self.point_to_int(p)))
         lock.add(self.point_to_int(p))
-        for d in Direction:
-            h = self.translate_point(p, d)
-            if h is not None:
-                lock.add(self.point_to_int(h))
-        allowed: Set[int] = set(range(0, self._width * self._height)) - lock
-
-        self._mines = set([self.int_to_point(x) for x in sample(list(allowed), self._count)])
+        self.place_mines(sample_mines(self._width * self._height, self._count, lock))
+
+    def place_mines(self, mines: List[int]) -> None:
+        cells = self._cells
+        counts = bytearray(self._width * self._height)
+        for i in mines:
+            cells[i] |= _MINE
+            for j in self.neighbors(i):
+                counts[j] += 1
+        self._counts = counts
+        self._label_regions()
+
+        unknown = bytearray([8]) * (self._width * self._height)
+        for i, border in self._border.items():
+            unknown[i] = len(border)
+        self._unknown = unknown
+        self._started = True
+
+    def start_region(self, p: Field) -> List[int]:
+        # Every cell whose first click opens the same cells as p does
+        i = self.point_to_int(p)
+        if self._cells[i] & _MINE:
+            return []
+        if self._counts[i] != 0:
+            return [i]
+        regions = self._regions
+        return [j for j in self._region_cells[regions[i]] if regions[j] == regions[i]]
+
+    def _label_regions(self) -> None:
+        cells = self._cells
+        counts = self._counts
+        size = self._width * self._height
+
+        regions = array('i', [-1]) * size
+        region_cells: List[array] = []
+        stamp = array('i', [-1]) * size
+        covered = bytearray(size)
+
+        for s in range(0, size):
+            if counts[s] != 0 or regions[s] >= 0 or cells[s] & _MINE:
+                continue
+
+            label = len(region_cells)
+            members = array('i', [s])
+            stamp[s] = label
+            k = 0
+            while k < len(members):
+                i = members[k]
+                k += 1
+                covered[i] = 1
+                if counts[i] == 0:
+                    regions[i] = label
+                    for j in self.neighbors(i):
+                        if stamp[j] != label:
+                            stamp[j] = label
+                            members.append(j)
+            region_cells.append(members)
+
+        bbbv = len(region_cells)
+        for i in range(0, size):
+            if not covered[i] and not cells[i] & _MINE:
+                bbbv += 1
+
+        self._regions = regions
+        self._region_cells = region_cells
+        self._bbbv = bbbv
 
     def hint(self):
-        if self.running:
-            copy = self.copy()
-            changed = solve(copy)
-
-            if changed:
+        if self.running and self.started:
+            if find_deduction(self) is not None:
                 self.lose()
                 return None
             else:
-                for p in self._opened:
-                    missing = self.count_mines(p) - self.count_flags(p)
-                    if missing > 0:
-                        for d in Direction:
-                            h = self.translate_point(p, d)
-                            if h in self._mines and h not in self._flags:
+                cells = self._cells
+                for i in sorted(self._frontier):
+                    if self.missing_mines(i) > 0:
+                        for j in self.neighbors(i):
+                            if cells[j] & (_MINE | _FLAG) == _MINE:
+                                h = self.int_to_point(j)
                                 self.flag_field(h, True)
-                                self._helped.add(h)
+                                cells[j] |= _HELPED
                                 return h
         return None
 
@@ -170,31 +353,73 @@ class Game:
             return None
         return None
 
+    def deduction(self) -> Optional[Tuple[Field, FieldState, Reason]]:
+        if self.running and self.started:
+            return find_deduction(self)
+        return None
+
+    def solve_steps(self) -> Iterator[List[Step]]:
+        if self.running:
+            yield from solve_steps(self)
+
     def solve_animated(self, draw: Callable[[Optional[List[Field]], Optional[Tuple[int, int]]], None]):
         if self.running:
             solve(self, draw)
             return None
         return None
 
+    @instrument.measured("game.open")
     def _open(self, p: Field) -> Set[Field]:
         changed = set()
+        cells = self._cells
 
-        if p in self._opened:
+        i = self.point_to_int(p)
+        if cells[i] & _OPEN:
             return changed
 
-        changed.add(p)
-        self._opened.add(p)
-
-        if self.count_mines(p) == 0:
-            for d in Direction:
-                h = self.translate_point(p, d)
-                if h is not None:
-                    changed.update(self._open(h))
-
+        if self._counts[i] == 0:
+            # Any opened zero cell has opened its whole region, so the
+            # precomputed region is exactly what a flood fill would reach
+            opened = [j for j in self._region_cells[self._regions[i]] if not cells[j] & _OPEN]
+        else:
+            opened = [i]
+
+        for j in opened:
+            if not cells[j] & _FLAG:
+                self._resolve(j)
+            cells[j] |= _OPEN
+            changed.add(self.int_to_point(j))
+
+        counts = self._counts
+        unknown = self._unknown
+        for j in opened:
+            if counts[j] > 0 and unknown[j] > 0:
+                self._frontier.add(j)
+
+        self._opened_count += len(opened)
+        if instrument.ENABLED:
+            instrument.increment("game.opened_cells", len(opened))
         return changed
 
+    def _resolve(self, i: int) -> None:
+        # Cell i stopped being unknown (opened or flagged)
+        unknown = self._unknown
+        for j in self.neighbors(i):
+            unknown[j] -= 1
+            if unknown[j] == 0:
+                self._frontier.discard(j)
+
+    def _unresolve(self, i: int) -> None:
+        # Cell i became unknown again (flag removed)
+        cells = self._cells
+        unknown = self._unknown
+        for j in self.neighbors(i):
+            unknown[j] += 1
+            if unknown[j] == 1 and cells[j] & _OPEN and self._counts[j] > 0:
+                self._frontier.add(j)
+
     def check_finished(self):
-        if len(self._opened) + len(self._mines) == self._width * self._height:
+        if self._opened_count + self._count == self._width * self._height:
             self._running = False
             self._won = True
             self._duration += current_time() - self._last_time
@@ -204,39 +429,41 @@ class Game:
         self._won = False
         self._duration += current_time() - self._last_time
 
+    @instrument.measured("game.click_field")
     def click_field(self, p: Field) -> Optional[Set[Field]]:
         if not self.started:
             self.init_mines(p)
             self._last_time = current_time()
             self._duration = 0
 
-        if p in self._flags:
+        cells = self._cells
+        i = self.point_to_int(p)
+        c = cells[i]
+        if c & _FLAG:
             return set()
 
-        if p in self._opened:
-            mine_count: int = 0
+        if c & _OPEN:
             flag_count: int = 0
-            for d in Direction:
-                h = self.translate_point(p, d)
-                if h in self._mines:
-                    mine_count += 1
-                if h in self._flags:
+            neighbors = self.neighbors(i)
+            for j in neighbors:
+                if cells[j] & _FLAG:
                     flag_count += 1
 
-            if mine_count == flag_count:
+            if self._counts[i] == flag_count:
                 s = set()
-                for d in Direction:
-                    h = self.translate_point(p, d)
-                    if h is not None and h not in self._flags:
-                        if h in self._mines:
-                            self.lose()
-                            return None
-                        else:
-                            s.update(self._open(h))
+                for j in neighbors:
+                    n = cells[j]
+                    if n & _FLAG:
+                        continue
+                    if n & _MINE:
+                        self.lose()
+                        return None
+                    else:
+                        s.update(self._open(self.int_to_point(j)))
                 self.check_finished()
                 return s
 
-        if p in self._mines:
+        if c & _MINE:
             self.lose()
             return None
 
@@ -245,23 +472,25 @@ class Game:
         return h
 
     def flag_field(self, p: Field, force: bool = None) -> None:
-        if self.started and p not in self._opened:
+        i = self.point_to_int(p)
+        c = self._cells[i]
+        if self.started and not c & _OPEN:
             if force is None:
-                if p in self._flags:
-                    self._flags.remove(p)
-                else:
-                    self._flags.add(p)
-                    self.check_finished()
-            else:
-                if force:
-                    self._flags.add(p)
-                    self.check_finished()
-                else:
-                    self._flags.remove(p)
+                force = not c & _FLAG
+            if force:
+                if not c & _FLAG:
+                    self._cells[i] = c | _FLAG
+                    self._flag_count += 1
+                    self._resolve(i)
+                self.check_finished()
+            elif c & _FLAG:
+                self._cells[i] = c & ~_FLAG
+                self._flag_count -= 1
+                self._unresolve(i)
 
     @property
     def mines_left(self) -> int:
-        return max(0, self._count - len(self._flags))
+        return max(0, self._count - self._flag_count)
 
     @property
     def running(self) -> bool:
@@ -285,56 +514,119 @@ class Game:
 
     @property
     def started(self) -> bool:
-        return self._mines is not None
+        return self._started
+
+    @property
+    def opened_count(self) -> int:
+        return self._opened_count
+
+    @property
+    def guess_free(self) -> bool:
+        return self._no_guess
+
+    def mine_cells(self) -> List[int]:
+        return [i for i, c in enumerate(self._cells) if c & _MINE]
+
+    @property
+    def openings(self) -> int:
+        return len(self._region_cells)
+
+    @property
+    def bbbv(self) -> int:
+        return self._bbbv
+
+    @property
+    def frontier(self) -> Set[int]:
+        return self._frontier
 
     @property
     def opened_fields(self) -> Set[Field]:
-        return set(self._opened)
+        return set([self.int_to_point(i) for i, c in enumerate(self._cells) if c & _OPEN])
+
+    def snapshot(self) -> bytes:
+        # Everything field_state reads per cell; equal snapshots render the same while running is unchanged
+        return bytes(self._cells)
+
+    def is_unknown(self, i: int) -> bool:
+        return not self._cells[i] & (_OPEN | _FLAG)
+
+    def unknown_count(self) -> int:
+        return self._cells.translate(_UNKNOWN_TABLE).count(1)
+
+    def unknown_cells(self) -> List[int]:
+        marks = self._cells.translate(_UNKNOWN_TABLE)
+        cells = []
+        i = marks.find(1)
+        while i >= 0:
+            cells.append(i)
+            i = marks.find(1, i + 1)
+        return cells
+
+    def missing_mines(self, i: int) -> int:
+        cells = self._cells
+        c = self._counts[i]
+        for j in self.neighbors(i):
+            if cells[j] & _FLAG:
+                c -= 1
+        return c
+
+    def probabilities(self) -> Dict[Field, float]:
+        return mine_probabilities(self)
 
     def count_mines(self, p: Field) -> int:
-        if p not in self._opened:
+        i = self.point_to_int(p)
+        if not self._cells[i] & _OPEN:
             raise ValueError("Count this field is not valid")
 
-        c: int = 0
-        for d in Direction:
-            if self.translate_point(p, d) in self._mines:
-                c += 1
-        return c
+        return self._counts[i]
 
     def count_flags(self, p: Field) -> int:
+        cells = self._cells
         c: int = 0
-        for d in Direction:
-            if self.translate_point(p, d) in self._flags:
+        for j in self.neighbors(self.point_to_int(p)):
+            if cells[j] & _FLAG:
                 c += 1
         return c
 
     def field_state(self, p: Field) -> FieldState:
-        if p in self._opened:
+        c = self._cells[self.point_to_int(p)]
+        if c & _OPEN:
             return FieldState.OPEN
 
         if self._running:
-            if p in self._flags:
-                if p in self._helped:
+            if c & _FLAG:
+                if c & _HELPED:
                     return FieldState.FLAG_HINT
                 return FieldState.FLAG
             return FieldState.DEFAULT
         else:
-            if p in self._mines:
-                if p in self._flags:
-                    if p in self._helped:
+            if c & _MINE:
+                if c & _FLAG:
+                    if c & _HELPED:
                         return FieldState.FLAG_HINT
                     return FieldState.FLAG_RIGHT
                 return FieldState.MINE
             else:
-                if p in self._flags:
+                if c & _FLAG:
                     return FieldState.FLAG_FALSE
                 return FieldState.DEFAULT
 
     def copy(self) -> 'Game':
         g = Game(self.width, self.height, self.count)
-        g._mines = self._mines.copy()
-        g._opened = self._opened.copy()
-        g._flags = self._flags.copy()
+        g._cells = bytearray(self._cells)
+        g._counts = self._counts
+        g._regions = self._regions
+        g._region_cells = self._region_cells
+        g._bbbv = self._bbbv
+        if self._unknown is not None:
+            g._unknown = bytearray(self._unknown)
+        g._frontier = set(self._frontier)
+        g._started = self._started
+        g._no_guess = self._no_guess
+        g.generation_attempts = self.generation_attempts
+        g.guess_fallback = self.guess_fallback
+        g._opened_count = self._opened_count
+        g._flag_count = self._flag_count
         g._running = self._running
         g._won = self._won
         return g
@@ -369,136 +661,676 @@ class Game:
         print("╰" + h + "╯")
 
 
+GENERATION_GRACE = 50
+PARALLEL_CELL_MIN = 40 * 40
+FILL_BUDGET = 200
+FILL_CELL_LIMIT = 100 * 100
+
+
+def cache_key(width: int, height: int, count: int, no_guess: bool) -> Key:
+    return width, height, count, Game.difficulty.value, no_guess
+
+
+def fill_board_cache(width: int, height: int, stop: Event) -> None:
+    # Background top-up of the board cache for the current settings, until stop is set. Larger boards are
+    # left out: a single attempt there is a long solve that stop cannot interrupt.
+    if width * height > FILL_CELL_LIMIT:
+        return
+    while not stop.is_set():
+        count = calc_mine_count(width, height)
+        key = cache_key(width, height, count, True)
+        if not Game.no_guess or BoardCache.size(key) >= BoardCache.target:
+            stop.wait(0.5)
+            continue
+
+        start = (randint(0, width - 1), randint(0, height - 1))
+        mines, _ = generate_no_guess(width, height, count, start, FILL_BUDGET)
+        if mines is not None and not stop.is_set() and key == cache_key(width, height, count, Game.no_guess):
+            board = Game(width, height, count, False)
+            board.place_mines(mines)
+            BoardCache.add(key, mines, board.start_region(start))
+
+
+@instrument.measured("generator.no_guess")
+def generate_no_guess(width: int, height: int, count: int, start: Field, budget: int,
+                      workers: int = 1) -> Tuple[Optional[List[int]], int]:
+    # Uniform layouts until the solver finishes one from the first click, or the budget (ms) runs out.
+    # Worker processes only pay off once a single attempt costs more than starting them.
+    if workers > 1 and width * height >= PARALLEL_CELL_MIN:
+        return _generate_parallel(width, height, count, start, budget, workers)
+
+    deadline = current_time() + budget
+    attempts = 0
+    while True:
+        attempts += 1
+        mines = _try_layout(width, height, count, start)
+        if mines is not None:
+            return mines, attempts
+        if current_time() >= deadline:
+            return None, attempts
+
+
+def _try_layout(width: int, height: int, count: int, start: Field) -> Optional[List[int]]:
+    probe = Game(width, height, count, False)
+    probe.click_field(start)
+    solve(probe)
+    if probe.won:
+        return probe.mine_cells()
+    return None
+
+
+def _generation_worker(width: int, height: int, count: int, start: Field, random_seed: int, slot: int,
+                       attempts, stop, results) -> None:
+    # Runs in its own process until a layout is found or stop is set; forked workers share the parent's
+    # random state, so reseed first
+    seed(random_seed)
+    try:
+        while not stop.is_set():
+            mines = _try_layout(width, height, count, start)
+            attempts[slot] += 1
+            if mines is not None:
+                results.put(mines)
+                break
+    except Exception as error:
+        results.put(error)
+    # Processes leave without running atexit; a worker killed mid-attempt writes no report
+    instrument.flush()
+
+
+def _generate_parallel(width: int, height: int, count: int, start: Field, budget: int,
+                       workers: int) -> Tuple[Optional[List[int]], int]:
+    deadline = current_time() + budget
+    # One lock-free counter per worker, since any worker may be killed halfway through an update
+    attempts = Array('i', workers, lock=False)
+    stop = ProcessEvent()
+    results = ProcessQueue()
+    processes = [Process(target=_generation_worker, daemon=True,
+                         args=(width, height, count, start, getrandbits(64), slot, attempts, stop, results))
+                 for slot in range(0, workers)]
+    for process in processes:
+        process.start()
+
+    try:
+        mines = results.get(timeout=max(0, deadline - current_time()) / 1000)
+    except Empty:
+        mines = None
+    finally:
+        # The first solvable layout wins. The others get a moment to finish their attempt and are then
+        # killed, since a single attempt on a huge board can run for minutes.
+        stop.set()
+        grace = current_time() + GENERATION_GRACE
+        for process in processes:
+            process.join(max(0, grace - current_time()) / 1000)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        results.close()
+
+    if isinstance(mines, BaseException):
+        raise mines
+    return mines, sum(attempts)
+
+
+ENDGAME_CELLS = 64
+
+
 def solve(game: Game, draw: Callable[
     [Optional[List[Field]], Optional[Tuple[int, int]], Optional[Tuple[int, int]]], None] = None) -> bool:
     changed = False
 
-    if not game.started:
-        game.click_field((0, 0))
-
-    while _solve_game(game, draw):
-        changed = True
-
-    if game.mines_left < game.count // 4:
-        game.highlight_missing = True
+    for steps in solve_steps(game):
+        for h, action, reason, opened in steps:
+            if reason != Reason.START:
+                changed = True
+            if draw is not None:
+                if action == FieldState.FLAG:
+                    draw([h], h)
+                else:
+                    draw(opened, h)
 
     return changed
 
 
-def _solve_bands(game: Game, b1: Tuple[int, Set[Field]], b2: Tuple[int, Set[Field]],
-                 draw: Callable[[Optional[List[Field]], Optional[Tuple[int, int]]], None]) -> bool:
-    b1_missing, b1_fields = b1
-    b2_missing, b2_fields = b2
+def solve_steps(game: Game) -> Iterator[List[Step]]:
+    if not game.started:
+        steps: List[Step] = []
+        _reveal(game, (0, 0), Reason.START, steps)
+        yield steps
+
+    # Worklist of frontier cells whose neighborhood changed since they were last looked at
+    todo = set(game.frontier)
+    while game.running:
+        steps = []
+        if instrument.ENABLED:
+            instrument.increment("solver.rounds")
+        if len(todo) > 0:
+            _solve_game(game, todo, steps)
+        else:
+            _solve_linear(game, steps)
+            if len(steps) == 0 and game.unknown_count() <= ENDGAME_CELLS:
+                _solve_endgame(game, steps)
+            if len(steps) == 0:
+                break
+        if len(steps) > 0:
+            yield steps
+        todo = _affected_cells(game, steps)
 
-    if len(b1_fields & b2_fields) == 0:
-        return False
+    if game.mines_left < game.count // 4:
+        game.highlight_missing = True
 
-    changed = False
 
-    if b2_fields <= b1_fields:
-        h = b2_fields
-        b2_fields = b1_fields
-        b1_fields = h
+def _flag(game: Game, h: Field, reason: Reason, steps: List[Step]) -> None:
+    game.flag_field(h, True)
+    steps.append((h, FieldState.FLAG, reason, None))
 
-        h = b2_missing
-        b2_missing = b1_missing
-        b1_missing = h
 
-    if b1_fields <= b2_fields:
-        outer = b2_fields - b1_fields
-        if (b2_missing - b1_missing) == 0:
-            for h in outer:
-                changed = True
-                x = game.click_field(h)
-                if draw is not None:
-                    draw(x, h)
-        elif len(outer) == (b2_missing - b1_missing):
-            for h in outer:
-                changed = True
-                game.flag_field(h, True)
-                if draw is not None:
-                    draw([h], h)
+def _reveal(game: Game, h: Field, reason: Reason, steps: List[Step]) -> None:
+    steps.append((h, FieldState.OPEN, reason, game.click_field(h)))
 
-    return changed
 
+def _affected_cells(game: Game, steps: List[Step]) -> Set[int]:
+    touched = set()
+    for h, _, _, opened in steps:
+        touched.add(h)
+        if opened is not None:
+            touched.update(opened)
 
-def _solve_section(game: Game, section: Set[Field],
-                   draw: Callable[[Optional[List[Field]], Optional[Tuple[int, int]]], None]) -> bool:
-    bands: List[Tuple[int, Set[Field]]] = []
-    changed = False
+    frontier = game.frontier
+    affected = set()
+    for p in touched:
+        i = game.point_to_int(p)
+        if i in frontier:
+            affected.add(i)
+        for j in game.neighbors(i):
+            if j in frontier:
+                affected.add(j)
+    return affected
 
-    for p in section:
-        missing = game.count_mines(p) - game.count_flags(p)
 
-        band = set()
-        for d in Direction:
-            h = game.translate_point(p, d)
-            if h is not None and game.field_state(h) == FieldState.DEFAULT:
-                band.add(h)
+def _bits(mask: int) -> List[int]:
+    bits = []
+    while mask:
+        low = mask & -mask
+        bits.append(low.bit_length() - 1)
+        mask ^= low
+    return bits
 
-        if missing > 0:
-            if len(band) == missing:
-                for h in band:
-                    game.flag_field(h, True)
-                    if draw is not None:
-                        draw([h], h)
-                    changed = True
-            else:
-                bands.append((missing, band))
-        else:
-            for h in band:
-                x = game.click_field(h)
-                if draw is not None:
-                    draw(x, h)
-                changed = True
 
-    for b1, b2 in itertools.combinations(bands, 2):
-        if _solve_bands(game, b1, b2, draw):
-            changed = True
+def _band_deduction(b1: Tuple[int, int], b2: Tuple[int, int]) -> Tuple[int, FieldState]:
+    # Cells outside the smaller band when one band contains the other, and what they must be
+    b1_missing, b1_fields = b1
+    b2_missing, b2_fields = b2
 
-    return changed
+    if b1_fields & b2_fields == 0:
+        return 0, FieldState.DEFAULT
 
+    if b2_fields & ~b1_fields == 0:
+        b1_fields, b2_fields = b2_fields, b1_fields
+        b1_missing, b2_missing = b2_missing, b1_missing
 
-def timing(f):
-    def wrap(*args):
-        time1 = time.time()
-        ret = f(*args)
-        time2 = time.time()
-        print('{:s} function took {:.3f} ms'.format(f.__name__, (time2 - time1) * 1000.0), file=sys.stderr)
+    if b1_fields & ~b2_fields == 0:
+        outer = b2_fields & ~b1_fields
+        if (b2_missing - b1_missing) == 0:
+            return outer, FieldState.OPEN
+        elif bin(outer).count("1") == (b2_missing - b1_missing):
+            return outer, FieldState.FLAG
 
-        return ret
+    return 0, FieldState.DEFAULT
 
-    return wrap
 
+def _solve_bands(game: Game, b1: Tuple[int, int], b2: Tuple[int, int], fields: List[Field],
+                 steps: List[Step]) -> None:
+    outer, action = _band_deduction(b1, b2)
+    for k in _bits(outer):
+        h = fields[k]
+        if game.field_state(h) == FieldState.DEFAULT:
+            if action == FieldState.OPEN:
+                _reveal(game, h, Reason.SUBSET, steps)
+            else:
+                _flag(game, h, Reason.SUBSET, steps)
 
-def get_opened(game: Game) -> Set[Field]:
-    return set([x for x in game.opened_fields if game.count_mines(x) > 0])
 
+def _solve_section(game: Game, section: Set[Field], steps: List[Step]) -> None:
+    bands, fields = _single_cell_rules(game, section, steps)
+    _pair_bands(game, bands, fields, steps)
 
-def _solve_game(game: Game, draw: Callable[[Optional[List[Field]], Optional[Tuple[int, int]]], None]) -> bool:
-    opened = get_opened(game)
 
-    def point_to_section(sec: Set[Field], p: Field):
-        todo = [p]
-        while len(todo) > 0:
-            p = todo.pop()
-            sec.add(p)
-            opened.remove(p)
-            for d in Direction:
-                h = game.translate_point(p, d)
-                if h is not None and h in opened and h not in todo:
-                    todo.append(h)
+@instrument.measured("solver.single_cell")
+def _single_cell_rules(game: Game, section: Set[Field],
+                       steps: List[Step]) -> Tuple[List[Tuple[int, int]], List[Field]]:
+    # Bands are bitmasks over a local index of the unknown cells seen in this section
+    local: Dict[int, int] = {}
+    fields: List[Field] = []
+    bands: List[Tuple[int, int]] = []
 
-    changed = False
+    for p in section:
+        missing = game.count_mines(p) - game.count_flags(p)
 
-    while len(opened) > 0:
-        section = set()
-        point_to_section(section, sample(opened, 1)[0])
+        band = []
+        for j in game.neighbors(game.point_to_int(p)):
+            if game.is_unknown(j):
+                band.append(j)
 
-        if _solve_section(game, section, draw):
-            changed = True
+        if missing > 0:
+            if len(band) == missing:
+                for j in band:
+                    _flag(game, game.int_to_point(j), Reason.ALL_MINES, steps)
+            else:
+                mask = 0
+                for j in band:
+                    k = local.get(j)
+                    if k is None:
+                        k = len(fields)
+                        local[j] = k
+                        fields.append(game.int_to_point(j))
+                    mask |= 1 << k
+                bands.append((missing, mask))
+        else:
+            for j in band:
+                _reveal(game, game.int_to_point(j), Reason.ALL_FLAGGED, steps)
+
+    return bands, fields
+
+
+@instrument.measured("solver.band_pairs")
+def _pair_bands(game: Game, bands: List[Tuple[int, int]], fields: List[Field], steps: List[Step]) -> None:
+    # Only bands sharing a cell can be paired, so index bands by the cells they cover
+    by_field: List[List[int]] = [[] for _ in fields]
+    for a, (_, mask) in enumerate(bands):
+        for k in _bits(mask):
+            by_field[k].append(a)
+
+    for a, b1 in enumerate(bands):
+        partners = set()
+        for k in _bits(b1[1]):
+            partners.update(by_field[k])
+        for b in sorted(partners):
+            if b > a:
+                _solve_bands(game, b1, bands[b], fields, steps)
+
+
+def _solve_game(game: Game, todo: Set[int], steps: List[Step]) -> None:
+    _solve_section(game, _section(game, todo), steps)
+
+
+@instrument.measured("solver.sectioning")
+def _section(game: Game, todo: Set[int]) -> Set[Field]:
+    frontier = game.frontier
+
+    # Every frontier cell sharing an unknown neighbor with a queued cell may form a new band pair with it.
+    # Bands are paired by the cells they cover, so the section does not need to be split further.
+    section = set()
+    for i in todo:
+        if i not in frontier:
+            continue
+        section.add(game.int_to_point(i))
+        for j in game.neighbors(i):
+            if game.is_unknown(j):
+                for k in game.neighbors(j):
+                    if k in frontier:
+                        section.add(game.int_to_point(k))
+    return section
+
+
+Constraint = Tuple[int, List[int]]
+
+
+def _frontier_components(game: Game) -> List[Tuple[List[int], List[Constraint]]]:
+    # Split the frontier into independent parts: unknown cells are linked when a frontier cell sees both
+    constraints: Dict[int, Constraint] = {}
+    owners: Dict[int, List[int]] = {}
+    for i in game.frontier:
+        cells = [j for j in game.neighbors(i) if game.is_unknown(j)]
+        constraints[i] = (game.missing_mines(i), cells)
+        for j in cells:
+            owners.setdefault(j, []).append(i)
+
+    components = []
+    seen: Set[int] = set()
+    for start in sorted(owners):
+        if start in seen:
+            continue
+
+        # Breadth first from a far away cell keeps the number of open constraints small while counting
+        for _ in range(0, 2):
+            order = [start]
+            visited = {start}
+            k = 0
+            while k < len(order):
+                for c in owners[order[k]]:
+                    for j in constraints[c][1]:
+                        if j not in visited:
+                            visited.add(j)
+                            order.append(j)
+                k += 1
+            start = order[-1]
+
+        seen.update(order)
+        cons = set()
+        for j in order:
+            cons.update(owners[j])
+        members = [constraints[c][1] for c in cons]
+
+        # Blob shaped parts count faster in row or column order than breadth first
+        width = game.width
+        candidates = [order, sorted(order), sorted(order, key=lambda j: (j % width, j // width))]
+        order = min(candidates, key=lambda o: _order_width(o, members))
+
+        components.append((order, [constraints[c] for c in sorted(cons)]))
+
+    return components
+
+
+def _order_width(order: List[int], members: List[List[int]]) -> int:
+    position = {j: k for k, j in enumerate(order)}
+    delta = [0] * (len(order) + 1)
+    for cells in members:
+        ks = [position[j] for j in cells]
+        delta[min(ks)] += 1
+        delta[max(ks)] -= 1
+    width = 0
+    active = 0
+    for d in delta:
+        active += d
+        width = max(width, active)
+    return width
+
+
+_STATE_LIMIT = 1 << 15
+
+
+def _count_component(cells: List[int], constraints: List[Constraint]) -> Optional[Tuple[List[int], List[List[int]]]]:
+    # Transfer matrix count over the cell order: the state at each position holds the partial sums
+    # of the constraints that have cells on both sides. Returns the number of solutions per mine count
+    # and, per cell, the number of those solutions in which the cell is a mine, or None when the
+    # component is too entangled to count exactly.
+    n = len(cells)
+    position = {j: k for k, j in enumerate(cells)}
+    values = [v for v, _ in constraints]
+    var_cons: List[List[int]] = [[] for _ in range(n)]
+    starting: List[List[int]] = [[] for _ in range(n)]
+    last = [0] * len(constraints)
+    # rest[k][c]: cells of constraint c after position k
+    rest: List[Dict[int, int]] = [{} for _ in range(n)]
+    for c, (_, members) in enumerate(constraints):
+        ks = sorted(position[j] for j in members)
+        for idx, k in enumerate(ks):
+            var_cons[k].append(c)
+            rest[k][c] = len(ks) - idx - 1
+        starting[ks[0]].append(c)
+        last[c] = ks[-1]
+
+    active: List[List[int]] = [[]]
+    for k in range(n):
+        a = [c for c in active[k] if last[c] > k] + [c for c in starting[k] if last[c] > k]
+        active.append(sorted(set(a)))
+
+    def step(k: int, state: Tuple[int, ...], x: int) -> Optional[Tuple[int, ...]]:
+        sums = dict(zip(active[k], state))
+        for c in var_cons[k]:
+            s = sums.get(c, 0) + x
+            if s > values[c] or s + rest[k][c] < values[c]:
+                return None
+            sums[c] = s
+        return tuple(sums[c] for c in active[k + 1])
+
+    def shift_add(target: Dict[int, int], source: Dict[int, int], x: int):
+        for m, w in source.items():
+            target[m + x] = target.get(m + x, 0) + w
+
+    forward: List[Dict[Tuple[int, ...], Dict[int, int]]] = [{(): {0: 1}}]
+    for k in range(n):
+        nxt: Dict[Tuple[int, ...], Dict[int, int]] = {}
+        for state, dist in forward[k].items():
+            for x in (0, 1):
+                s = step(k, state, x)
+                if s is not None:
+                    shift_add(nxt.setdefault(s, {}), dist, x)
+        if len(nxt) > _STATE_LIMIT:
+            return None
+        forward.append(nxt)
+
+    backward: List[Dict[Tuple[int, ...], Dict[int, int]]] = [{} for _ in range(n)] + [{(): {0: 1}}]
+    mine_weights: List[Dict[int, int]] = [{} for _ in range(n)]
+    for k in range(n - 1, -1, -1):
+        for state, dist in forward[k].items():
+            back: Dict[int, int] = {}
+            for x in (0, 1):
+                s = step(k, state, x)
+                if s is None or s not in backward[k + 1]:
+                    continue
+                tail = backward[k + 1][s]
+                shift_add(back, tail, x)
+                if x == 1:
+                    for m1, w1 in dist.items():
+                        for m2, w2 in tail.items():
+                            m = m1 + m2 + 1
+                            mine_weights[k][m] = mine_weights[k].get(m, 0) + w1 * w2
+            if len(back) > 0:
+                backward[k][state] = back
+
+    total = backward[0].get((), {})
+    solutions = [total.get(m, 0) for m in range(n + 1)]
+    mines = [[weights.get(m, 0) for m in range(n + 1)] for weights in mine_weights]
+    return solutions, mines
+
+
+def _multiply(a: List[int], b: List[int]) -> List[int]:
+    r = [0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                r[i + j] += x * y
+    return r
+
+
+def _eliminate(row: Dict[int, Fraction], rhs: Fraction, k: int,
+               pivot: Tuple[Dict[int, Fraction], Fraction]) -> Fraction:
+    f = row[k]
+    p_row, p_rhs = pivot
+    for kk, a in p_row.items():
+        v = row.get(kk, 0) - f * a
+        if v == 0:
+            row.pop(kk, None)
+        else:
+            row[kk] = v
+    return rhs - f * p_rhs
+
+
+def _reduce(constraints: List[Constraint], order: List[int]) -> List[Tuple[Dict[int, Fraction], Fraction]]:
+    # Reduced row echelon form of the 0/1 constraint matrix, columns in the given cell order
+    column = {j: k for k, j in enumerate(order)}
+    pivots: Dict[int, Tuple[Dict[int, Fraction], Fraction]] = {}
+    for value, cells in constraints:
+        row = {column[j]: Fraction(1) for j in cells}
+        rhs = Fraction(value)
+        while True:
+            shared = [k for k in row if k in pivots]
+            if len(shared) == 0:
+                break
+            k = min(shared)
+            rhs = _eliminate(row, rhs, k, pivots[k])
+        if len(row) == 0:
+            continue
+        k = min(row)
+        f = row[k]
+        pivots[k] = ({kk: a / f for kk, a in row.items()}, rhs / f)
+
+    for k in sorted(pivots, reverse=True):
+        for other, (o_row, o_rhs) in pivots.items():
+            if other != k and k in o_row:
+                pivots[other] = (o_row, _eliminate(o_row, o_rhs, k, pivots[k]))
+
+    return list(pivots.values())
+
+
+def _linear_deductions(game: Game, first: bool = False) -> Tuple[Set[int], Set[int]]:
+    # Bounds on reduced rows catch deductions that need three or more overlapping constraints
+    safe: Set[int] = set()
+    mines: Set[int] = set()
+    for order, constraints in _frontier_components(game):
+        for row, rhs in _reduce(constraints, order):
+            low = sum(a for a in row.values() if a < 0)
+            high = sum(a for a in row.values() if a > 0)
+            for k, a in row.items():
+                rest_low = low - min(a, 0)
+                rest_high = high - max(a, 0)
+                if not rest_low <= rhs - a <= rest_high:
+                    safe.add(order[k])
+                elif not rest_low <= rhs <= rest_high:
+                    mines.add(order[k])
+            if first and len(safe) + len(mines) > 0:
+                return safe, mines
+    return safe, mines
+
+
+@instrument.measured("solver.linear")
+def _solve_linear(game: Game, steps: List[Step]) -> None:
+    safe, mines = _linear_deductions(game)
+    for i in sorted(mines):
+        _flag(game, game.int_to_point(i), Reason.LINEAR, steps)
+    for i in sorted(safe):
+        h = game.int_to_point(i)
+        if game.field_state(h) == FieldState.DEFAULT:
+            _reveal(game, h, Reason.LINEAR, steps)
+            if not game.running:
+                break
+
+
+def _mine_weights(game: Game) -> Optional[Tuple[Dict[int, Fraction], int]]:
+    # Number of consistent layouts with a mine on each unknown cell, and the number of all layouts
+    if not game.started or not game.running:
+        return None
 
-    return changed
+    components = _frontier_components(game)
+    counted = []
+    for cells, constraints in components:
+        c = _count_component(cells, constraints)
+        if c is None:
+            return None
+        counted.append(c)
+
+    border = sum(len(cells) for cells, _ in components)
+    interior = game.unknown_count() - border
+    left = game.mines_left
+
+    ways: Dict[int, int] = {}
+
+    def interior_ways(m: int) -> int:
+        if m < 0 or m > interior:
+            return 0
+        if m not in ways:
+            ways[m] = comb(interior, m)
+        return ways[m]
+
+    # Combine the mine count distributions of all components but one, via prefix and suffix products
+    prefix = [[1]]
+    for solutions, _ in counted:
+        prefix.append(_multiply(prefix[-1], solutions))
+    suffix = [[1]]
+    for solutions, _ in reversed(counted):
+        suffix.append(_multiply(suffix[-1], solutions))
+    suffix.reverse()
+
+    dist = prefix[-1]
+    total = sum(w * interior_ways(left - s) for s, w in enumerate(dist))
+    if total == 0:
+        return None
+
+    weights: Dict[int, Fraction] = {}
+    for c, (cells, _) in enumerate(components):
+        others = _multiply(prefix[c], suffix[c + 1])
+        weight = [sum(w * interior_ways(left - m - s) for s, w in enumerate(others)) for m in range(len(cells) + 1)]
+        _, mines = counted[c]
+        for k, j in enumerate(cells):
+            weights[j] = Fraction(sum(x * y for x, y in zip(mines[k], weight)))
+
+    if interior > 0:
+        expected = sum(w * interior_ways(left - s) * (left - s) for s, w in enumerate(dist))
+        p = Fraction(expected, interior)
+        for i in game.unknown_cells():
+            if i not in weights:
+                weights[i] = p
+
+    return weights, total
+
+
+def mine_probabilities(game: Game) -> Dict[Field, float]:
+    result = _mine_weights(game)
+    if result is None:
+        return {}
+
+    weights, total = result
+    return {game.int_to_point(i): float(w / total) for i, w in weights.items()}
+
+
+@instrument.measured("solver.endgame")
+def _solve_endgame(game: Game, steps: List[Step]) -> None:
+    # With the global mine count some cells are safe or mines in every consistent layout
+    result = _mine_weights(game)
+    if result is None:
+        return
+
+    weights, total = result
+    for i in sorted(weights):
+        if weights[i] == total:
+            _flag(game, game.int_to_point(i), Reason.ENDGAME, steps)
+    for i in sorted(weights):
+        h = game.int_to_point(i)
+        if weights[i] == 0 and game.field_state(h) == FieldState.DEFAULT:
+            _reveal(game, h, Reason.ENDGAME, steps)
+            if not game.running:
+                break
+
+
+def find_deduction(game: Game) -> Optional[Tuple[Field, FieldState, Reason]]:
+    # The first provable step, cheapest rules first, without touching the game
+    local: Dict[int, int] = {}
+    fields: List[int] = []
+    bands: Dict[int, Tuple[int, int]] = {}
+    for i in sorted(game.frontier):
+        missing = game.missing_mines(i)
+        band = [j for j in game.neighbors(i) if game.is_unknown(j)]
+        if missing <= 0:
+            return game.int_to_point(band[0]), FieldState.OPEN, Reason.ALL_FLAGGED
+        if missing == len(band):
+            return game.int_to_point(band[0]), FieldState.FLAG, Reason.ALL_MINES
+
+        mask = 0
+        for j in band:
+            if j not in local:
+                local[j] = len(fields)
+                fields.append(j)
+            mask |= 1 << local[j]
+        bands[i] = (missing, mask)
+
+    for i in sorted(bands):
+        partners = set()
+        for j in game.neighbors(i):
+            if game.is_unknown(j):
+                partners.update(k for k in game.neighbors(j) if k > i and k in bands)
+        for k in sorted(partners):
+            outer, action = _band_deduction(bands[i], bands[k])
+            if outer:
+                return game.int_to_point(fields[_bits(outer)[0]]), action, Reason.SUBSET
+
+    safe, mines = _linear_deductions(game, True)
+    if len(mines) > 0:
+        return game.int_to_point(min(mines)), FieldState.FLAG, Reason.LINEAR
+    if len(safe) > 0:
+        return game.int_to_point(min(safe)), FieldState.OPEN, Reason.LINEAR
+
+    if game.unknown_count() <= ENDGAME_CELLS:
+        result = _mine_weights(game)
+        if result is not None:
+            weights, total = result
+            for i in sorted(weights):
+                if weights[i] == total:
+                    return game.int_to_point(i), FieldState.FLAG, Reason.ENDGAME
+                if weights[i] == 0:
+                    return game.int_to_point(i), FieldState.OPEN, Reason.ENDGAME
+
+    return None
 
 
 if __name__ == "__main__":
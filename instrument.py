@@ -0,0 +1,126 @@
+#!/bin/python
+
+import atexit
+import json
+from functools import wraps
+from multiprocessing import parent_process
+from os import environ, getpid, register_at_fork, path
+from time import perf_counter_ns
+from typing import Callable, Dict, List, Any
+
+# PMINES_PROFILE=<report.json> turns instrumentation on; when unset, measured() hands functions back untouched
+REPORT = environ.get("PMINES_PROFILE")
+ENABLED = REPORT is not None
+
+_BUCKETS = 64
+
+_counters: Dict[str, int] = {}
+_timers: Dict[str, List[Any]] = {}
+
+
+def increment(name: str, n: int = 1) -> None:
+    _counters[name] = _counters.get(name, 0) + n
+
+
+def _timer(name: str) -> List[Any]:
+    # count, total, min, max, log2 histogram of nanoseconds
+    if name not in _timers:
+        _timers[name] = [0, 0, None, 0, [0] * _BUCKETS]
+    return _timers[name]
+
+
+def record(name: str, ns: int) -> None:
+    _add(_timer(name), ns)
+
+
+def _add(timer: List[Any], ns: int) -> None:
+    timer[0] += 1
+    timer[1] += ns
+    if timer[2] is None or ns < timer[2]:
+        timer[2] = ns
+    if ns > timer[3]:
+        timer[3] = ns
+    timer[4][min(ns.bit_length(), _BUCKETS - 1)] += 1
+
+
+def measured(name: str) -> Callable[[Callable], Callable]:
+    def decorate(f: Callable) -> Callable:
+        if not ENABLED:
+            return f
+
+        timer = _timer(name)
+
+        @wraps(f)
+        def wrap(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                _add(timer, perf_counter_ns() - start)
+
+        return wrap
+
+    return decorate
+
+
+def _percentile(buckets: List[int], total: int, p: float) -> float:
+    # Upper bound of the bucket holding the p-th sample, in ms
+    seen = 0
+    for k, n in enumerate(buckets):
+        seen += n
+        if seen >= p * total:
+            return (1 << k) / 1e6
+    return 0.0
+
+
+def report() -> Dict[str, Any]:
+    timers = {}
+    for name, (n, total, low, high, buckets) in sorted(_timers.items()):
+        if n == 0:
+            continue
+        timers[name] = {
+            "count": n,
+            "total_ms": total / 1e6,
+            "mean_ms": total / n / 1e6,
+            "min_ms": low / 1e6,
+            "max_ms": high / 1e6,
+            "p50_ms": _percentile(buckets, n, 0.50),
+            "p95_ms": _percentile(buckets, n, 0.95),
+            "p99_ms": _percentile(buckets, n, 0.99),
+            "histogram": {"<{}ns".format(1 << k): v for k, v in enumerate(buckets) if v > 0},
+        }
+    return {"pid": getpid(), "counters": dict(sorted(_counters.items())), "timers": timers}
+
+
+def dump(filename: str) -> None:
+    with open(filename, "w") as file:
+        json.dump(report(), file, indent=2)
+
+
+def report_file() -> str:
+    # Worker processes write next to the main report, suffixed with their pid. Asking multiprocessing rather
+    # than comparing pids also holds for spawned workers, which import this module afresh.
+    filename = REPORT or "pmines-profile.json"
+    if parent_process() is None:
+        return filename
+    root, ext = path.splitext(filename)
+    return "{}.{}{}".format(root, getpid(), ext)
+
+
+def flush() -> None:
+    # Worker processes leave through os._exit and never run atexit, so they call this once their batch is done
+    if ENABLED:
+        dump(report_file())
+
+
+def _reset() -> None:
+    # A forked child starts from zero instead of repeating what the parent had measured.
+    # Timers are cleared in place, the measured() wrappers hold on to them.
+    _counters.clear()
+    for timer in _timers.values():
+        timer[:] = [0, 0, None, 0, [0] * _BUCKETS]
+
+
+if ENABLED:
+    atexit.register(flush)
+    register_at_fork(after_in_child=_reset)
@@ -6,9 +6,12 @@ from operator import itemgetter
 from os import path, environ
 from typing import Set, List, Tuple, Optional
 
+import instrument
 from game import Game, Field, FieldState
+from boardcache import BoardCache
 from scoreboard import Scoreboard
 from views.menu import Menu
+from views.renderer import Renderer, Glyph, GlyphTable, glyph_table
 
 
 def init_color():
@@ -188,37 +191,36 @@ def generate_game() -> Game:
     return Game(curses.COLS // 2, curses.LINES - 3)
 
 
-def render_point(stdscr, game: Game, p: Field) -> None:
+def glyph(glyphs: GlyphTable, game: Game, p: Field) -> Glyph:
+    if game.paused:
+        return glyphs[(FieldState.DEFAULT, 0)]
     state = game.field_state(p)
-    x, y = p
-    x = x * 2 + 1
-    if state == FieldState.DEFAULT or game.paused:
-        stdscr.addstr(y, x, '*')
-    elif state == FieldState.FLAG:
-        stdscr.addstr(y, x, '?')
-    elif state == FieldState.FLAG_HINT:
-        stdscr.addstr(y, x, '?', curses.color_pair(8))
-    elif state == FieldState.OPEN:
-        count = game.count_mines(p)
-        if count == 0:
-            stdscr.addstr(y, x, ' ')
-        else:
-            stdscr.addstr(y, x, str(count), curses.color_pair(count))
-    elif state == FieldState.MINE:
-        stdscr.addstr(y, x, 'X', curses.color_pair(9))
-    elif state == FieldState.FLAG_FALSE:
-        stdscr.addstr(y, x, '!', curses.color_pair(9))
-    elif state == FieldState.FLAG_RIGHT:
-        stdscr.addstr(y, x, '?')
+    if state == FieldState.OPEN:
+        return glyphs[(state, game.count_mines(p))]
+    return glyphs[(state, 0)]
+
+
+_renderer: Optional[Renderer] = None
+
+
+def get_renderer(stdscr, game: Game) -> Renderer:
+    global _renderer
+    if _renderer is None or _renderer.game is not game:
+        glyphs = glyph_table()
+        _renderer = Renderer(stdscr, game, lambda p: glyph(glyphs, game, p))
+    return _renderer
+
+
+@instrument.measured("render.point")
+def render_point(stdscr, game: Game, p: Field) -> None:
+    get_renderer(stdscr, game).draw_point(p)
 
 
 def render_all(stdscr, game: Game):
     if game is None:
         return
 
-    for x in range(0, game.width):
-        for y in range(0, game.height):
-            render_point(stdscr, game, (x, y))
+    get_renderer(stdscr, game).draw_all((game.running, game.paused))
 
 
 def ordinal(number: int) -> str:
@@ -308,6 +310,7 @@ def game_round(stdscr) -> Optional[Game]:
             stdscr.refresh()
             if show_score(game):
                 return None
+            stdscr.touchwin()
             game.unpause()
             render_all(stdscr, game)
             render_foot(stdscr, game)
@@ -347,6 +350,7 @@ def main(stdscr):
 
             if wants_playing and show_score(game, game.duration):
                 wants_playing = False
+            stdscr.touchwin()
             curses.curs_set(0)
 
         render_all(stdscr, game)
@@ -361,6 +365,7 @@ def main(stdscr):
             elif c == ord('p') or c == ord('P') or c == ord('i') or c == ord('I'):
                 if show_score(game):
                     wants_playing = False
+                stdscr.touchwin()
                 curses.curs_set(0)
                 render_all(stdscr, game)
                 render_foot(stdscr, game)
@@ -379,6 +384,7 @@ def startup(screen):
     bottom = curses.newwin(2, width, height - 2, 0)
 
     Scoreboard.load()
+    BoardCache.load()
 
     menu = Menu(screen, top, bottom)
     menu.start()
@@ -5,6 +5,8 @@ from os import path
 from re import match
 from typing import List, Tuple, Optional, Dict
 
+import instrument
+
 Scorelist = List[Tuple[int, str]]
 
 
@@ -15,6 +17,7 @@ class Scoreboard:
     PLACEHOLDER = "-- Your score --"
 
     @staticmethod
+    @instrument.measured("scoreboard.load")
     def load():
         if path.isfile(Scoreboard._filename):
             with open(Scoreboard._filename, "r") as file:
@@ -37,6 +40,7 @@ class Scoreboard:
                             Scoreboard._list[number] = curr_list
 
     @staticmethod
+    @instrument.measured("scoreboard.store")
     def store():
         save = []
         for key in Scoreboard._list.keys():
@@ -0,0 +1,119 @@
+#!/bin/python
+
+import csv
+import json
+import random
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
+from typing import List, Tuple, Dict
+
+import instrument
+from game import Game, Difficulty, solve
+
+Config = Tuple[int, int, Difficulty, bool]
+Result = Tuple[float, bool, float]
+
+FIELDS = ["width", "height", "difficulty", "no_guess", "games", "games_per_second", "mean_ms", "p50_ms", "p95_ms",
+          "p99_ms", "win_rate", "solved_fraction"]
+
+
+def parse_config(text: str) -> Config:
+    # WIDTHxHEIGHT[:difficulty][:ng], e.g. 30x16:hard:ng
+    parts = text.lower().split(":")
+    width, height = parts[0].split("x")
+    difficulty = Difficulty.NORMAL
+    no_guess = False
+    for part in parts[1:]:
+        if part == "ng":
+            no_guess = True
+        else:
+            difficulty = Difficulty[part.upper()]
+    return int(width), int(height), difficulty, no_guess
+
+
+def play(config: Config, game_seed: int) -> Result:
+    width, height, difficulty, no_guess = config
+    random.seed(game_seed)
+    Game.difficulty = difficulty
+    # Already inside a worker process; a nested generation pool would only oversubscribe the cores
+    Game.generation_workers = 1
+
+    game = Game(width, height, 0, no_guess)
+    start = time.perf_counter()
+    game.click_field((width // 2, height // 2))
+    solve(game)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    return elapsed, bool(game.won), game.opened_count / (width * height - game.count)
+
+
+def play_batch(config: Config, seeds: List[int]) -> List[Result]:
+    results = [play(config, game_seed) for game_seed in seeds]
+    # The profile report is written once per batch, so its file I/O stays out of the games being measured
+    instrument.flush()
+    return results
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def summarize(config: Config, results: List[Result], wall: float) -> Dict[str, object]:
+    width, height, difficulty, no_guess = config
+    times = [r[0] for r in results]
+    return {
+        "width": width,
+        "height": height,
+        "difficulty": difficulty.name,
+        "no_guess": no_guess,
+        "games": len(results),
+        "games_per_second": round(len(results) / wall, 3),
+        "mean_ms": round(sum(times) / len(times), 3),
+        "p50_ms": round(percentile(times, 0.50), 3),
+        "p95_ms": round(percentile(times, 0.95), 3),
+        "p99_ms": round(percentile(times, 0.99), 3),
+        "win_rate": round(sum(1 for r in results if r[1]) / len(results), 4),
+        "solved_fraction": round(sum(r[2] for r in results) / len(results), 4),
+    }
+
+
+def simulate(configs: List[Config], games: int, base_seed: int, workers: int) -> List[Dict[str, object]]:
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for config in configs:
+            # Game k of a configuration always gets the same seed, so runs are comparable across commits
+            seeds = [base_seed + k for k in range(0, games)]
+            size = max(1, games // (workers * 4))
+            batches = [seeds[k:k + size] for k in range(0, games, size)]
+            start = time.perf_counter()
+            results = [r for batch in pool.map(play_batch, [config] * len(batches), batches) for r in batch]
+            reports.append(summarize(config, results, time.perf_counter() - start))
+    return reports
+
+
+def main(argv: List[str]) -> None:
+    parser = ArgumentParser(description="Play seeded games with the built-in solver and report throughput.")
+    parser.add_argument("configs", nargs="*", default=["9x9:easy", "16x16", "30x16:hard"],
+                        help="WIDTHxHEIGHT[:easy|normal|hard][:ng]")
+    parser.add_argument("-n", "--games", type=int, default=100)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-w", "--workers", type=int, default=cpu_count() or 1)
+    parser.add_argument("-f", "--format", choices=["json", "csv"], default="json")
+    args = parser.parse_args(argv)
+
+    reports = simulate([parse_config(c) for c in args.configs], args.games, args.seed, args.workers)
+
+    if args.format == "json":
+        print(json.dumps(reports, indent=2))
+    else:
+        writer = csv.DictWriter(sys.stdout, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(reports)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -35,9 +35,9 @@ class Dialog(View):
 
         super().clean()
 
-    def refresh(self):
-        super().refresh()
-        self._window.refresh()
+    def noutrefresh(self):
+        super().noutrefresh()
+        self._window.noutrefresh()
 
     def start(self):
         width = len(self.title)
@@ -1,9 +1,10 @@
 from sys import exit
+from threading import Event, Thread
 
-from game import calc_mine_count, Game
+from game import calc_mine_count, Game, fill_board_cache
 from views.dialog import Dialog
 from views.player import Player
-from views.utils import get_size_from_screen
+from views.utils import get_board_size
 from views.score import Score
 from views.settings import Settings
 
@@ -17,13 +18,38 @@ class Menu(Dialog):
         self.add_entry("Settings", self.settings)
         self.add_entry("Quit", self.quit)
 
+        self._filler_stop = None
+
+    def start_filler(self):
+        height, width = get_board_size(self._top)
+        self._filler_stop = Event()
+        Thread(target=fill_board_cache, args=(width, height, self._filler_stop), daemon=True).start()
+
+    def stop_filler(self):
+        if self._filler_stop is not None:
+            self._filler_stop.set()
+            self._filler_stop = None
+
+    def start(self):
+        # Boards are pre-generated only while the menu is open, never during a game
+        self.start_filler()
+        try:
+            super().start()
+        finally:
+            self.stop_filler()
+
     def draw_footer(self):
-        height, width = get_size_from_screen(self._top)
-        return "", "", "Difficulty: " + str(calc_mine_count(width, height)) + " (" + Game.difficulty.name + ")", "1.0.0"
+        height, width = get_board_size(self._top)
+        mode = Game.difficulty.name
+        if Game.no_guess:
+            mode += ", NO GUESS"
+        return "", "", "Difficulty: " + str(calc_mine_count(width, height)) + " (" + mode + ")", "1.0.0"
 
     def start_game(self) -> bool:
+        self.stop_filler()
         player = Player(self._screen, self._top, self._bottom)
         player.start()
+        self.start_filler()
         return False
 
     def score(self) -> bool:
@@ -34,6 +60,9 @@ class Menu(Dialog):
     def settings(self) -> bool:
         settings = Settings(self._screen, self._top, self._bottom)
         settings.start()
+        # The board size may have changed
+        self.stop_filler()
+        self.start_filler()
         return False
 
     @staticmethod
@@ -1,81 +1,120 @@
 import curses
-from typing import Optional, List, Set, Tuple
+import time
+from typing import Optional, List, Set
 
+import instrument
 import views.utils
 from game import Field, Game, FieldState
 from scoreboard import Scoreboard
 from views.pause import Pause
+from views.renderer import Renderer, Glyph, glyph_table
 from views.score import Score
 from views.view import View
 
 
 class Player(View):
 
+    animation_fps = 30
+
     def __init__(self, screen, top, bottom):
         super(Player, self).__init__(screen, top, bottom)
-        h, w = views.utils.get_size_from_screen(top)
+        h, w = views.utils.get_board_size(top)
+        view_h, view_w = views.utils.get_size_from_screen(top)
 
         self._position = (w // 2, h // 2)
 
         self._game = Game(w, h)
+        self._glyphs = glyph_table()
+        self._renderer = Renderer(top, self._game, self.glyph, (view_w, view_h))
+        self._renderer.follow(self._position, max(view_w, view_h))
+        self._scrolled = w > view_w or h > view_h
 
-    def render_point(self, p: Field) -> None:
-        sel = curses.A_NORMAL
-        if p == self._position and self._game.running:
-            sel = curses.A_REVERSE
+    def glyph(self, p: Field) -> Glyph:
         state = self._game.field_state(p)
-        x, y = p
-        x = x * 2 + 1
-        if state == FieldState.DEFAULT:
-            if self._game.highlight_missing:
-                self._top.addstr(y, x, '*', curses.color_pair(10) | sel)
-            else:
-                self._top.addstr(y, x, '*', sel)
-        elif state == FieldState.FLAG or state == FieldState.FLAG_RIGHT:
-            self._top.addstr(y, x, '?', sel)
-        elif state == FieldState.FLAG_HINT:
-            self._top.addstr(y, x, '?', curses.color_pair(8) | sel)
-        elif state == FieldState.OPEN:
-            count = self._game.count_mines(p)
-            if count == 0:
-                self._top.addstr(y, x, ' ', sel)
-            else:
-                self._top.addstr(y, x, str(count), curses.color_pair(count) | sel)
-        elif state == FieldState.MINE:
-            self._top.addstr(y, x, 'X', curses.color_pair(9) | sel)
-        elif state == FieldState.FLAG_FALSE:
-            self._top.addstr(y, x, '!', curses.color_pair(9) | sel)
-
-    def get_listen_window(self):
-        return self._screen
+        detail = 0
+        if state == FieldState.OPEN:
+            detail = self._game.count_mines(p)
+        elif state == FieldState.DEFAULT and self._game.highlight_missing:
+            detail = 1
+        glyph = self._glyphs[(state, detail)]
+        if p == self._position and self._game.running:
+            return glyph[0], glyph[1] | curses.A_REVERSE
+        return glyph
 
-    def sleep_draw(self, refresh: Optional[List[Field]], cursor: Optional[Tuple[int, int]] = None):
-        if cursor is not None:
-            if refresh is not None:
-                refresh = list(refresh)
-                refresh.append(self._position)
-            self._position = cursor
+    @instrument.measured("render.point")
+    def render_point(self, p: Field) -> None:
+        self._renderer.draw_point(p)
 
-        self.draw(refresh)
+    def clean_top(self):
+        super().clean_top()
+        self._renderer.reset(('*', curses.A_NORMAL))
 
-        self.refresh()
-        # time.sleep(0.01)
+    def get_listen_window(self):
+        return self._screen
 
+    def animate_solve(self):
+        # Deductions are coalesced into frames of at most animation_fps per second; any key skips to the end
+        game = self._game
+        interval = 1 / Player.animation_fps
+        listen = self.get_listen_window()
+        listen.nodelay(True)
+
+        dirty: Set[Field] = set()
+        next_frame = time.perf_counter()
+        steps = game.solve_steps()
+        try:
+            for round_steps in steps:
+                for h, action, _, opened in round_steps:
+                    if action == FieldState.FLAG:
+                        dirty.add(h)
+                    elif opened is not None:
+                        dirty.update(opened)
+                    dirty.add(self._position)
+                    self._position = h
+
+                    if time.perf_counter() >= next_frame:
+                        if self._renderer.follow(self._position):
+                            self.draw()
+                        else:
+                            self.draw(list(dirty))
+                        self.refresh()
+                        dirty.clear()
+                        next_frame = time.perf_counter() + interval
+                        if listen.getch() != -1:
+                            for _ in steps:
+                                pass
+                            return
+        finally:
+            # The caller redraws the whole board, which also covers cells not shown yet; steps after the last
+            # frame may have moved the cursor, so the view has to catch up first
+            listen.nodelay(False)
+            self._renderer.follow(self._position)
+
+    @instrument.measured("render.draw")
     def draw(self, refresh: List[Field] = None):
         if self._game.auto_solve:
             self._game.auto_solve = False
-            self.sleep_draw(None)
-            self._game.solve_animated(self.sleep_draw)
+            if self._game.running:
+                self.draw()
+                self.refresh()
+                self.animate_solve()
 
         if refresh is None:
-            for x in range(0, self._game.width):
-                for y in range(0, self._game.height):
-                    self.render_point((x, y))
+            self._renderer.draw_all((self._game.running, self._game.highlight_missing), self._position)
         else:
             for p in refresh:
                 self.render_point(p)
 
         self.clean_bottom()
+        if self._scrolled:
+            _, width = self._bottom.getmaxyx()
+            x, y = self._position
+            where = "{}, {} of {}x{}".format(x + 1, y + 1, self._game.width, self._game.height)
+            self._bottom.addstr(0, width - 1 - len(where), where)
+        if self._game.guess_fallback:
+            _, width = self._bottom.getmaxyx()
+            note = "guessing required ({} attempts)".format(self._game.generation_attempts)
+            self._bottom.addstr(1, width - 1 - len(note), note, curses.color_pair(9))
         if self._game.running:
             self._bottom.addstr(0, 1, "live", curses.color_pair(8))
             self._bottom.addstr(1, 1, str(self._game.mines_left) + " mines remaining",
@@ -98,6 +137,8 @@ class Player(View):
 
         pause = Pause(self._screen, self._top, self._bottom, self._game)
         pause.start()
+        # The dialog painted over the board, so the renderer must not trust what it last drew
+        self.clean_top()
 
         self._game.unpause()
         self.draw()
@@ -152,7 +193,7 @@ class Player(View):
 
             h = self.action_on_running(key)
 
-            if h is None:
+            if h is None or self._renderer.follow(self._position):
                 return None
             else:
                 refresh.update(h)
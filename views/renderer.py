@@ -0,0 +1,168 @@
+import curses
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import instrument
+from game import Field, FieldState, Game
+
+Glyph = Tuple[str, int]
+GlyphTable = Dict[Tuple[FieldState, int], Glyph]
+
+
+def glyph_table() -> GlyphTable:
+    # Keyed by state and detail: the mine count for open cells, 1 for highlighted unknown cells
+    table: GlyphTable = {
+        (FieldState.DEFAULT, 0): ('*', curses.A_NORMAL),
+        (FieldState.DEFAULT, 1): ('*', curses.color_pair(10)),
+        (FieldState.FLAG, 0): ('?', curses.A_NORMAL),
+        (FieldState.FLAG_RIGHT, 0): ('?', curses.A_NORMAL),
+        (FieldState.FLAG_HINT, 0): ('?', curses.color_pair(8)),
+        (FieldState.MINE, 0): ('X', curses.color_pair(9)),
+        (FieldState.FLAG_FALSE, 0): ('!', curses.color_pair(9)),
+        (FieldState.OPEN, 0): (' ', curses.A_NORMAL),
+    }
+    for count in range(1, 9):
+        table[(FieldState.OPEN, count)] = (str(count), curses.color_pair(count))
+    return table
+
+
+class Renderer:
+    # Shadow buffer of the glyph last written for every visible cell, so redraws only touch cells that changed.
+    # The window shows a view of columns x rows cells starting at origin; nothing outside it is drawn or queried.
+
+    def __init__(self, window, game: Game, glyph: Callable[[Field], Glyph], view: Optional[Tuple[int, int]] = None):
+        if view is None:
+            view = (game.width, game.height)
+        self._window = window
+        self._game = game
+        self._glyph = glyph
+        self._columns = min(view[0], game.width)
+        self._rows = min(view[1], game.height)
+        self._origin: Field = (0, 0)
+        self._shadow: List[Optional[Glyph]] = [None] * (self._columns * self._rows)
+        self._seen: Optional[bytes] = None
+        self._mode: Hashable = None
+        self._cursor: Optional[Field] = None
+        self._blank_safe: Dict[int, bool] = {}
+
+    @property
+    def game(self) -> Game:
+        return self._game
+
+    @property
+    def origin(self) -> Field:
+        return self._origin
+
+    def visible(self, p: Field) -> bool:
+        ox, oy = self._origin
+        return ox <= p[0] < ox + self._columns and oy <= p[1] < oy + self._rows
+
+    def follow(self, p: Field, margin: int = 2) -> bool:
+        # Scrolls just enough to keep p at least margin cells inside the view; True if the view moved
+        game = self._game
+        ox, oy = self._origin
+        ox = _follow_axis(ox, p[0], self._columns, game.width, margin)
+        oy = _follow_axis(oy, p[1], self._rows, game.height, margin)
+        moved = (ox, oy) != self._origin
+        self._origin = (ox, oy)
+        return moved
+
+    def reset(self, glyph: Optional[Glyph] = None) -> None:
+        # The window was drawn over; glyph is what every cell shows now, None if unknown
+        self._shadow = [glyph] * len(self._shadow)
+        self._seen = None
+
+    def draw_point(self, p: Field) -> None:
+        if not self.visible(p):
+            return
+        x, y = p[0] - self._origin[0], p[1] - self._origin[1]
+        i = x + self._columns * y
+        glyph = self._glyph(p)
+        if self._shadow[i] != glyph:
+            self._shadow[i] = glyph
+            self._window.addstr(y, x * 2 + 1, glyph[0], glyph[1])
+            if instrument.ENABLED:
+                instrument.increment("render.writes")
+
+    @instrument.measured("render.all")
+    def draw_all(self, mode: Hashable = None, cursor: Optional[Field] = None) -> None:
+        # mode holds whatever changes the look of every cell at once (running, highlighting, ...).
+        # Otherwise only visible rows whose game state changed since the last full draw can look different.
+        game = self._game
+        cells = game.snapshot()
+        width = game.width
+        ox, oy = self._origin
+        mode = (mode, self._origin)
+
+        rows: Set[int]
+        if self._seen is None or mode != self._mode:
+            rows = set(range(0, self._rows))
+        elif cells == self._seen:
+            rows = set()
+        else:
+            seen = self._seen
+            rows = set()
+            for y in range(0, self._rows):
+                start = (oy + y) * width + ox
+                if cells[start:start + self._columns] != seen[start:start + self._columns]:
+                    rows.add(y)
+        for p in (self._cursor, cursor):
+            if p is not None and self.visible(p):
+                rows.add(p[1] - oy)
+
+        for y in sorted(rows):
+            self._draw_row(y)
+
+        self._seen = cells
+        self._mode = mode
+        self._cursor = cursor
+
+    def _draw_row(self, y: int) -> None:
+        columns = self._columns
+        glyph = self._glyph
+        ox, oy = self._origin
+        base = y * columns
+        row = [glyph((ox + x, oy + y)) for x in range(0, columns)]
+        old = self._shadow[base:base + columns]
+        if row == old:
+            return
+
+        first = 0
+        while row[first] == old[first]:
+            first += 1
+        last = columns - 1
+        while row[last] == old[last]:
+            last -= 1
+        self._shadow[base + first:base + last + 1] = row[first:last + 1]
+
+        # Cells sit on odd columns with a blank between them. A run of cells sharing an attribute goes out
+        # in one call, as long as painting the blanks in that attribute does not show (no background, no reverse).
+        x = first
+        while x <= last:
+            attr = row[x][1]
+            end = x + 1
+            if self._is_blank_safe(attr):
+                while end <= last and row[end][1] == attr:
+                    end += 1
+            self._window.addstr(y, x * 2 + 1, " ".join([g[0] for g in row[x:end]]), attr)
+            if instrument.ENABLED:
+                instrument.increment("render.writes")
+            x = end
+
+    def _is_blank_safe(self, attr: int) -> bool:
+        safe = self._blank_safe.get(attr)
+        if safe is None:
+            safe = not attr & (curses.A_REVERSE | curses.A_STANDOUT)
+            if safe and curses.has_colors():
+                _, background = curses.pair_content(curses.pair_number(attr))
+                safe = background == -1
+            self._blank_safe[attr] = safe
+        return safe
+
+
+def _follow_axis(origin: int, p: int, view: int, size: int, margin: int) -> int:
+    margin = min(margin, (view - 1) // 2)
+    if p < origin + margin:
+        origin = p - margin
+    elif p >= origin + view - margin:
+        origin = p - view + margin + 1
+    return max(0, min(origin, size - view))
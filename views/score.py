@@ -105,9 +105,9 @@ class Score(View):
 
         super().clean()
 
-    def refresh(self):
-        super().refresh()
-        self._window.refresh()
+    def noutrefresh(self):
+        super().noutrefresh()
+        self._window.noutrefresh()
 
     def setup(self):
         max_height, max_width = self._screen.getmaxyx()
@@ -3,6 +3,9 @@ from sys import exit
 from views.dialog import Dialog
 from game import Game, Difficulty
 
+BOARD_SIZES = [None, (100, 100), (300, 300), (1000, 1000)]
+
+
 class Settings(Dialog):
 
     def __init__(self, screen, top, bottom):
@@ -14,6 +17,14 @@ class Settings(Dialog):
         self.add_entry("Easy", self.easy)
         self.add_entry("Normal", self.normal)
         self.add_entry("Hard", self.hard)
+        if Game.no_guess:
+            self.add_entry("Allow guessing", self.toggle_no_guess)
+        else:
+            self.add_entry("No guessing", self.toggle_no_guess)
+        if Game.board_size is None:
+            self.add_entry("Board: fit screen", self.next_board_size)
+        else:
+            self.add_entry("Board: {}x{}".format(*Game.board_size), self.next_board_size)
 
     def easy(self) -> bool:
         Game.difficulty = Difficulty.EASY
@@ -26,4 +37,15 @@ class Settings(Dialog):
     def hard(self) -> bool:
         Game.difficulty = Difficulty.HARD
         return True
+
+    @staticmethod
+    def toggle_no_guess() -> bool:
+        Game.no_guess = not Game.no_guess
+        return True
+
+    @staticmethod
+    def next_board_size() -> bool:
+        index = BOARD_SIZES.index(Game.board_size) if Game.board_size in BOARD_SIZES else 0
+        Game.board_size = BOARD_SIZES[(index + 1) % len(BOARD_SIZES)]
+        return True
     
@@ -1,5 +1,8 @@
 from typing import Tuple
 
+import instrument
+from game import Game
+
 
 def get_size_from_screen(screen) -> Tuple[int, int]:
     height, width = screen.getmaxyx()
@@ -9,18 +12,27 @@ def get_size_from_screen(screen) -> Tuple[int, int]:
     return height, width
 
 
+def get_board_size(screen) -> Tuple[int, int]:
+    # Boards fit the screen unless a size is configured, which may be larger and is then scrolled
+    if Game.board_size is not None:
+        width, height = Game.board_size
+        return height, width
+    return get_size_from_screen(screen)
+
+
 def game_pos_to_screen_pos(pos: Tuple[int, int]) -> Tuple[int, int]:
     return pos[0], pos[1] * 2 + 1
 
 
+@instrument.measured("render.background")
 def render_background(screen) -> None:
     height, width = get_size_from_screen(screen)
 
+    # One call per row: blank line with a '*' on every cell column
+    _, screen_width = screen.getmaxyx()
+    row = (" *" * width).ljust(screen_width - 1)
     for y in range(0, height):
-        screen.hline(y, 0, " ", width - 1)
-        for x in range(0, width):
-            new_y, new_x = game_pos_to_screen_pos((y, x))
-            screen.addstr(new_y, new_x, "*")
+        screen.addstr(y, 0, row)
 
 
 def draw_border(screen) -> None:
@@ -61,8 +61,13 @@ class View(ABC):
         height, width = self._screen.getmaxyx()
         self._screen.hline(height - 3, 0, " ", width - 1)
 
+    def noutrefresh(self):
+        self._screen.noutrefresh()
+        self._top.noutrefresh()
+        self._bottom.noutrefresh()
+
     def refresh(self):
-        self._screen.refresh()
-        self._top.refresh()
-        self._bottom.refresh()
+        # All windows are staged first so the terminal is written once
+        self.noutrefresh()
+        curses.doupdate()
 